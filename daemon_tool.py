@@ -1,19 +1,28 @@
 #!/usr/bin/env python3
 import os
 import sys
-import json
 import time
 import signal
 import socket
-import subprocess
+import struct
+import selectors
+import itertools
+import collections
+import codecs
+import functools
 import threading
 import logging
-import argparse
-from pathlib import Path
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-import tempfile
-import shlex
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, Union, Any
+
+# json, orjson, argparse, subprocess, shlex, datetime and
+# concurrent.futures are imported where they are used, most CLI calls
+# never need them
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # Configuration
 DEFAULT_INSTANCE_NAME = "default"
@@ -21,36 +30,181 @@ DEFAULT_BASE_DIR = "/tmp/daemon_instances"
 DEFAULT_LOG_DIR = "/tmp"
 MAX_LOG_SIZE = 10 * 1024 * 1024  # 10MB per log file
 MAX_LOG_FILES = 5
+LOG_BUFFER_SIZE = 64 * 1024  # Flush buffered process output at this size
+LOG_FLUSH_INTERVAL = 0.1  # ...or once it has been buffered this long (seconds)
+LOG_TAIL_BLOCK_SIZE = 8192  # Logs are tailed backwards in blocks of this size
+STOP_TIMEOUT = 5  # Seconds a stopped process gets to exit before SIGKILL
+
+# Wire protocol: every message is a msgpack or JSON document prefixed by
+# its length. The daemon answers in whichever encoding the request used.
+# The socket stays SOCK_STREAM rather than SOCK_SEQPACKET: log responses
+# and follow streams are unbounded, while a packet must fit the socket
+# buffer, and macOS has no AF_UNIX SEQPACKET. A frame and its header are
+# still read with a single recv of up to RECV_SIZE bytes.
+FRAME_HEADER = struct.Struct('>I')
+RECV_SIZE = 65536
+MAX_REQUEST_SIZE = 1024 * 1024  # Larger request headers close the connection
+SEND_CHUNK_SIZE = 65536  # Responses are encoded in chunks of about this size
+WRITEV_MAX_BUFFERS = 64
+FOLLOW_MAX_QUEUED = 8 * 1024 * 1024  # Followers further behind are dropped
+
+# Part of a file queued for a client, sent with os.sendfile. The fd is
+# owned by the queue and closed once the region is sent or dropped.
+FileRegion = collections.namedtuple('FileRegion', 'fd offset length')
 
 def get_instance_paths(instance_name: str = DEFAULT_INSTANCE_NAME, base_dir: str = DEFAULT_BASE_DIR) -> Dict[str, str]:
     """Get paths for a specific daemon instance"""
-    instance_dir = Path(base_dir) / instance_name
-    instance_dir.mkdir(parents=True, exist_ok=True)
+    instance_dir = os.path.join(base_dir, instance_name)
+    os.makedirs(instance_dir, exist_ok=True)
 
     return {
-        'socket': str(instance_dir / "control.sock"),
-        'pid_file': str(instance_dir / "daemon.pid"),
-        'log_dir': str(instance_dir / "logs"),
-        'instance_dir': str(instance_dir)
+        'socket': os.path.join(instance_dir, "control.sock"),
+        'pid_file': os.path.join(instance_dir, "daemon.pid"),
+        'log_dir': os.path.join(instance_dir, "logs"),
+        'instance_dir': instance_dir
     }
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+@functools.lru_cache(maxsize=None)
+def load_orjson():
+    """Import orjson on first use, None if it is not installed"""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+def encode_message(message: Dict[str, Any], codec: str = 'json') -> List[bytes]:
+    """Encode a message as a length-prefixed list of chunks
+
+    The chunks are sent with writev. For JSON without orjson, no single
+    contiguous copy of a large response is ever built.
+    """
+    if codec == 'msgpack':
+        body = msgpack.packb(message)
+        return [FRAME_HEADER.pack(len(body)), body]
+
+    orjson = load_orjson()
+    if orjson is not None:
+        body = orjson.dumps(message)
+        return [FRAME_HEADER.pack(len(body)), body]
+
+    import json
+
+    chunks = []
+    pending = []
+    pending_size = 0
+    for piece in json.JSONEncoder().iterencode(message):
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= SEND_CHUNK_SIZE:
+            chunks.append(''.join(pending).encode('utf-8'))
+            pending = []
+            pending_size = 0
+    if pending:
+        chunks.append(''.join(pending).encode('utf-8'))
+
+    length = sum(len(chunk) for chunk in chunks)
+    return [FRAME_HEADER.pack(length), *chunks]
+
+def detect_codec(data) -> str:
+    """Tell msgpack from JSON by the first byte of a message body
+
+    JSON text always starts with an ASCII byte, a msgpack map never does.
+    """
+    return 'msgpack' if data and data[0] >= 0x80 else 'json'
+
+def decode_message(data, codec: str = 'json') -> Any:
+    """Decode a message body from bytes"""
+    if codec == 'msgpack':
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        return msgpack.unpackb(data, raw=False)
+
+    orjson = load_orjson()
+    if orjson is not None:
+        return orjson.loads(data)
+
+    import json
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+class CachedResponse:
+    """A constant response, framed once per codec and then reused"""
+
+    def __init__(self, message: Dict[str, Any]):
+        self.message = message
+        self._frames: Dict[str, bytes] = {}
+
+    def encode(self, codec: str) -> bytes:
+        """Get the framed response for a codec"""
+        frame = self._frames.get(codec)
+        if frame is None:
+            frame = b''.join(encode_message(self.message, codec))
+            self._frames[codec] = frame
+        return frame
+
+# Constant replies skip encoding entirely after their first use
+PONG = CachedResponse({'success': True, 'message': 'pong'})
+SUCCESS = CachedResponse({'success': True})
+FAILURE = CachedResponse({'success': False})
+ERR_COMMAND_REQUIRED = CachedResponse({'error': 'Command required'})
+ERR_PROCESS_ID_REQUIRED = CachedResponse({'error': 'Process ID required'})
+ERR_INVALID_JSON = CachedResponse({'error': 'Invalid JSON'})
+ERR_INVALID_MSGPACK = CachedResponse({'error': 'Invalid msgpack'})
+ERR_INVALID_REQUEST = CachedResponse({'error': 'Invalid request'})
+ERR_REQUEST_TOO_LARGE = CachedResponse({'error': 'Request too large'})
+# Sent in JSON to msgpack requests when msgpack is not installed, clients
+# then retry in JSON
+MSGPACK_UNSUPPORTED = 'msgpack unsupported'
+ERR_MSGPACK_UNSUPPORTED = CachedResponse({'error': MSGPACK_UNSUPPORTED})
+
 logger = logging.getLogger(__name__)
 
+def setup_logging():
+    """Configure daemon logging, deferred until a daemon actually starts"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
 class ProcessManager:
     """Manages background processes"""
 
-    def __init__(self, log_dir: str = DEFAULT_LOG_DIR):
-        self.processes: Dict[str, Dict[str, Any]] = {}
-        self.log_dir = Path(log_dir)
-        self.log_dir.mkdir(exist_ok=True)
+    def __init__(self, log_dir: str = DEFAULT_LOG_DIR, on_output: Callable[[str, int], None] = None):
+        # Copy-on-write: writers swap in a new dict under _lock, readers
+        # just take a reference. Neither the dict nor its entries are
+        # ever modified in place.
+        self._snapshot: Dict[str, Dict[str, Any]] = {}
+        self.pid_to_id: Dict[int, str] = {}
+        # Popen objects for processes started through the fallback path
+        self._popens: Dict[int, 'subprocess.Popen'] = {}
+        # Output pipes by read fd, on_output is called with each new one
+        self._outputs: Dict[int, Dict[str, Any]] = {}
+        # Read fd of each process's current output pipe. After a name is
+        # reused, the pipe of the earlier process may still be open too.
+        self._output_fds: Dict[str, int] = {}
+        # Read-only log fds by process ID, reused across log requests
+        self._log_readers: Dict[str, int] = {}
+        # SIGKILL deadlines by pid for processes sent SIGTERM, see kill_overdue
+        self._kill_deadlines: Dict[int, float] = {}
+        self.on_output = on_output
+        self.log_dir = log_dir
+        os.makedirs(self.log_dir, exist_ok=True)
         self._lock = threading.Lock()
         self._next_id = 1
 
+    @property
+    def processes(self) -> Dict[str, Dict[str, Any]]:
+        """Current process table, must be treated as read-only"""
+        return self._snapshot
+
+    def _update(self, proc_id: str, **changes):
+        """Publish a new snapshot with one process entry changed, needs _lock"""
+        snapshot = dict(self._snapshot)
+        snapshot[proc_id] = {**snapshot.get(proc_id, {}), **changes}
+        self._snapshot = snapshot
+
     def start_process(self, command: str, name: str = None, working_dir: str = None) -> str:
         """Start a new background process"""
         with self._lock:
@@ -58,161 +212,415 @@ class ProcessManager:
             proc_id = name if name else f"proc_{self._next_id}"
             self._next_id += 1
 
-            if proc_id in self.processes:
+            if proc_id in self._snapshot:
                 raise ValueError(f"Process '{proc_id}' already exists")
 
             # Set up logging
-            log_file = self.log_dir / f"{proc_id}.log"
+            log_file = os.path.join(self.log_dir, f"{proc_id}.log")
 
             try:
                 # Parse command
                 if isinstance(command, str):
+                    import shlex
                     cmd_args = shlex.split(command)
                 else:
                     cmd_args = command
 
-                # Start process
-                with open(log_file, 'w') as log_f:
-                    proc = subprocess.Popen(
-                        cmd_args,
-                        stdout=log_f,
-                        stderr=subprocess.STDOUT,
-                        cwd=working_dir,
-                        preexec_fn=os.setsid  # Create new process group
-                    )
-
-                # Store process info
-                self.processes[proc_id] = {
-                    'process': proc,
-                    'command': command,
-                    'started_at': datetime.now().isoformat(),
-                    'log_file': str(log_file),
-                    'working_dir': working_dir,
-                    'status': 'running'
+                # Child output goes through a pipe so the daemon can batch
+                # log writes instead of the child writing the file directly
+                read_fd, write_fd = os.pipe()
+                log_fd = None
+                try:
+                    log_fd = os.open(log_file,
+                                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND | os.O_CLOEXEC,
+                                     0o644)
+
+                    # Start process
+                    if working_dir is None:
+                        # posix_spawn avoids the fork+exec slow path that
+                        # preexec_fn forces on subprocess.Popen
+                        pid = os.posix_spawnp(
+                            cmd_args[0],
+                            cmd_args,
+                            os.environ,
+                            file_actions=[
+                                (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                                (os.POSIX_SPAWN_DUP2, write_fd, 2),
+                            ],
+                            setsid=True,  # Create new process group
+                            # Like Popen's restore_signals, undo the ignored
+                            # SIGPIPE/SIGXFSZ inherited from the interpreter
+                            setsigdef=(signal.SIGPIPE, signal.SIGXFSZ)
+                        )
+                    else:
+                        # posix_spawn has no chdir file action, fall back to
+                        # Popen (start_new_session keeps it off the slow
+                        # preexec_fn path)
+                        import subprocess
+                        proc = subprocess.Popen(
+                            cmd_args,
+                            stdout=write_fd,
+                            stderr=subprocess.STDOUT,
+                            cwd=working_dir,
+                            start_new_session=True  # Create new process group
+                        )
+                        pid = proc.pid
+                        self._popens[pid] = proc
+                except Exception:
+                    os.close(read_fd)
+                    if log_fd is not None:
+                        os.close(log_fd)
+                    raise
+                finally:
+                    # Only the child keeps the write end open
+                    os.close(write_fd)
+
+                os.set_blocking(read_fd, False)
+                self._close_log_reader(proc_id)
+                self._outputs[read_fd] = {
+                    'proc_id': proc_id,
+                    'log_file': log_file,
+                    'log_fd': log_fd,
+                    'buf': bytearray(),
+                    'buffered_at': None
                 }
+                self._output_fds[proc_id] = read_fd
 
-                logger.info(f"Started process '{proc_id}' (PID: {proc.pid})")
+                # Store process info
+                self._update(
+                    proc_id,
+                    pid=pid,
+                    command=command,
+                    started_at_ns=time.time_ns(),
+                    log_file=log_file,
+                    working_dir=working_dir,
+                    status='running'
+                )
+                self.pid_to_id[pid] = proc_id
+
+                if self.on_output is not None:
+                    self.on_output(proc_id, read_fd)
+
+                logger.info(f"Started process '{proc_id}' (PID: {pid})")
                 return proc_id
 
             except Exception as e:
                 logger.error(f"Failed to start process '{proc_id}': {e}")
                 raise
 
+    def _record_exit(self, proc_id: str, pid: int, wait_status: int):
+        """Store the exit status of a reaped process, needs _lock"""
+        exit_code = os.waitstatus_to_exitcode(wait_status)
+        self._kill_deadlines.pop(pid, None)
+        proc = self._popens.pop(pid, None)
+        if proc is not None:
+            # Keep Popen from waiting on a pid we already reaped
+            proc.returncode = exit_code
+
+        proc_info = self._snapshot.get(proc_id)
+        if proc_info is None:
+            return
+
+        status = 'finished' if proc_info['status'] == 'running' else proc_info['status']
+        self._update(proc_id, status=status, exit_code=exit_code)
+
+    def reap_children(self) -> int:
+        """Reap every exited child and record its exit status"""
+        reaped = 0
+        with self._lock:
+            while True:
+                try:
+                    pid, wait_status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+
+                if pid == 0:
+                    break
+
+                proc_id = self.pid_to_id.pop(pid, None)
+                self._record_exit(proc_id, pid, wait_status)
+                reaped += 1
+
+        return reaped
+
     def stop_process(self, proc_id: str, force: bool = False) -> bool:
-        """Stop a process"""
+        """Stop a process
+
+        Does not wait for it to exit. A process that ignores SIGTERM is
+        killed by kill_overdue once STOP_TIMEOUT has passed.
+        """
         with self._lock:
-            if proc_id not in self.processes:
+            if proc_id not in self._snapshot:
                 return False
 
-            proc_info = self.processes[proc_id]
-            proc = proc_info['process']
+            proc_info = self._snapshot[proc_id]
+            pid = proc_info['pid']
 
-            if proc.poll() is not None:
+            if proc_info['status'] != 'running':
                 # Process already finished
-                proc_info['status'] = 'finished'
                 return True
 
             try:
                 if force:
                     # Kill process group
-                    os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+                    os.killpg(os.getpgid(pid), signal.SIGKILL)
                 else:
                     # Terminate process group gracefully
-                    os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-
-                    # Wait a bit for graceful shutdown
-                    try:
-                        proc.wait(timeout=5)
-                    except subprocess.TimeoutExpired:
-                        # Force kill if graceful shutdown failed
-                        os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+                    os.killpg(os.getpgid(pid), signal.SIGTERM)
+                    self._kill_deadlines[pid] = time.monotonic() + STOP_TIMEOUT
 
-                proc_info['status'] = 'stopped'
+                self._update(proc_id, status='stopped')
                 logger.info(f"Stopped process '{proc_id}'")
                 return True
 
             except ProcessLookupError:
                 # Process already dead
-                proc_info['status'] = 'finished'
+                self._update(proc_id, status='finished')
                 return True
             except Exception as e:
                 logger.error(f"Failed to stop process '{proc_id}': {e}")
                 return False
 
-    def get_process_status(self, proc_id: str = None) -> Dict[str, Any]:
-        """Get status of one or all processes"""
-        with self._lock:
-            if proc_id:
-                if proc_id not in self.processes:
-                    return {}
+    def kill_overdue(self) -> Optional[float]:
+        """Force kill processes still running STOP_TIMEOUT after being stopped
 
-                proc_info = self.processes[proc_id].copy()
-                proc = proc_info['process']
+        Returns the seconds until the next deadline, or None if no stop is
+        pending.
+        """
+        now = time.monotonic()
+        next_deadline = None
+        with self._lock:
+            for pid, deadline in list(self._kill_deadlines.items()):
+                due = deadline - now
+                if due > 0:
+                    if next_deadline is None or due < next_deadline:
+                        next_deadline = due
+                    continue
+
+                del self._kill_deadlines[pid]
+                try:
+                    os.killpg(os.getpgid(pid), signal.SIGKILL)
+                except ProcessLookupError:
+                    continue
+                logger.warning(f"Killed process '{self.pid_to_id.get(pid, pid)}' after it ignored SIGTERM")
 
-                # Update status
-                if proc.poll() is not None:
-                    proc_info['status'] = 'finished'
-                    proc_info['exit_code'] = proc.returncode
+        return next_deadline
 
-                # Remove process object from returned data
-                del proc_info['process']
-                return {proc_id: proc_info}
-            else:
-                # Return all processes
-                result = {}
-                for pid, proc_info in self.processes.items():
-                    info = proc_info.copy()
-                    proc = info['process']
-
-                    # Update status
-                    if proc.poll() is not None:
-                        info['status'] = 'finished'
-                        info['exit_code'] = proc.returncode
+    def get_process_status(self, proc_id: str = None) -> Dict[str, Any]:
+        """Get status of one or all processes
 
-                    # Remove process object
-                    del info['process']
-                    result[pid] = info
+        Reads a snapshot without taking the lock, the result must be
+        treated as read-only.
+        """
+        snapshot = self._snapshot
+        if proc_id:
+            if proc_id not in snapshot:
+                return {}
+            return {proc_id: snapshot[proc_id]}
 
-                return result
+        # Return all processes
+        return snapshot
 
     def get_process_log(self, proc_id: str, lines: int = 50) -> List[str]:
         """Get recent log lines from a process"""
-        if proc_id not in self.processes:
+        proc_info = self._snapshot.get(proc_id)
+        if proc_info is None:
             return []
 
-        log_file = Path(self.processes[proc_id]['log_file'])
-        if not log_file.exists():
+        try:
+            # Include output still buffered in the daemon
+            self.flush_log(proc_id)
+            fd = self._log_reader(proc_id, proc_info['log_file'])
+            size = os.fstat(fd).st_size
+            offset = self._tail_offset(fd, size, lines)
+            data = os.pread(fd, size - offset, offset)
+            return [line.decode('utf-8', errors='replace').rstrip()
+                    for line in data.splitlines()[-lines:]]
+        except Exception as e:
+            logger.error(f"Failed to read log for '{proc_id}': {e}")
             return []
 
+    def get_process_log_region(self, proc_id: str, lines: int = 50) -> Optional[FileRegion]:
+        """Locate recent log lines of a process so they can be sent as-is"""
         try:
-            with open(log_file, 'r') as f:
-                all_lines = f.readlines()
-                return [line.rstrip() for line in all_lines[-lines:]]
+            proc_info = self._snapshot.get(proc_id)
+            if proc_info is None:
+                return None
+
+            # Include output still buffered in the daemon
+            self.flush_log(proc_id)
+            fd = self._log_reader(proc_id, proc_info['log_file'])
+            size = os.fstat(fd).st_size
+            offset = self._tail_offset(fd, size, lines)
+            # The region gets its own fd, the cached one may be closed first
+            return FileRegion(os.dup(fd), offset, size - offset)
         except Exception as e:
             logger.error(f"Failed to read log for '{proc_id}': {e}")
-            return []
+            return None
+
+    @staticmethod
+    def _tail_offset(fd: int, size: int, lines: int) -> int:
+        """Find where the last lines of a file start, reading backwards from the end"""
+        if lines <= 0:
+            return 0
+
+        offset = size
+        while offset > 0:
+            step = min(LOG_TAIL_BLOCK_SIZE, offset)
+            end = step
+            offset -= step
+            block = os.pread(fd, step, offset)
+            if offset + step == size and block.endswith(b'\n'):
+                # A trailing newline ends the last line rather than starting one
+                end -= 1
+
+            end = block.rfind(b'\n', 0, end)
+            while end >= 0:
+                lines -= 1
+                if not lines:
+                    return offset + end + 1
+                end = block.rfind(b'\n', 0, end)
+        return 0
+
+    def _log_reader(self, proc_id: str, log_file: str) -> int:
+        """Get the cached read-only fd for a process log"""
+        fd = self._log_readers.get(proc_id)
+        if fd is None:
+            fd = os.open(log_file, os.O_RDONLY | os.O_CLOEXEC)
+            self._log_readers[proc_id] = fd
+        return fd
+
+    def _close_log_reader(self, proc_id: str):
+        """Close the cached read-only fd for a process log, if any"""
+        fd = self._log_readers.pop(proc_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def reopen_logs(self):
+        """Reopen every log file, e.g. after logrotate moved them away"""
+        for output in self._outputs.values():
+            self._flush_output(output)
+            try:
+                log_fd = os.open(output['log_file'],
+                                 os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC,
+                                 0o644)
+            except OSError as e:
+                logger.error(f"Failed to reopen log for '{output['proc_id']}': {e}")
+                continue
+            os.close(output['log_fd'])
+            output['log_fd'] = log_fd
+
+        for proc_id in list(self._log_readers):
+            self._close_log_reader(proc_id)
+
+        logger.info("Reopened log files")
+
+    def drain_output(self, fd: int) -> Optional[bytes]:
+        """Read pending output from a process pipe into its log buffer
+
+        Returns the bytes read, b'' once the pipe is closed, or None if
+        nothing was available.
+        """
+        output = self._outputs[fd]
+        try:
+            data = os.read(fd, LOG_BUFFER_SIZE)
+        except BlockingIOError:
+            return None
+
+        if data:
+            if not output['buf']:
+                output['buffered_at'] = time.monotonic()
+            output['buf'] += data
+            if len(output['buf']) >= LOG_BUFFER_SIZE:
+                self._flush_output(output)
+
+        return data
+
+    def _flush_output(self, output: Dict[str, Any]):
+        """Write a process's buffered output to its log file"""
+        buf = output['buf']
+        try:
+            while buf:
+                written = os.write(output['log_fd'], buf)
+                del buf[:written]
+        except OSError as e:
+            logger.error(f"Failed to write log for '{output['proc_id']}': {e}")
+            buf.clear()
+
+    def flush_logs(self, force: bool = False) -> Optional[float]:
+        """Flush output buffered for longer than LOG_FLUSH_INTERVAL
+
+        Returns the seconds until the next flush is due, or None if no
+        output is buffered.
+        """
+        now = time.monotonic()
+        next_flush = None
+        for output in self._outputs.values():
+            if not output['buf']:
+                continue
+
+            due = output['buffered_at'] + LOG_FLUSH_INTERVAL - now
+            if force or due <= 0:
+                self._flush_output(output)
+            elif next_flush is None or due < next_flush:
+                next_flush = due
+
+        return next_flush
+
+    def flush_log(self, proc_id: str):
+        """Flush the output buffered for one process"""
+        fd = self._output_fds.get(proc_id)
+        if fd is not None:
+            self._flush_output(self._outputs[fd])
+
+    def output_fd(self, proc_id: str) -> Optional[int]:
+        """Get the read fd of a process's output pipe, None once it is closed"""
+        return self._output_fds.get(proc_id)
+
+    def close_output(self, fd: int):
+        """Flush and close a process output pipe and its log file"""
+        output = self._outputs.pop(fd)
+        if self._output_fds.get(output['proc_id']) == fd:
+            del self._output_fds[output['proc_id']]
+        self._flush_output(output)
+        os.close(output['log_fd'])
+        os.close(fd)
 
     def cleanup_finished(self) -> int:
         """Remove finished processes from tracking"""
         with self._lock:
-            to_remove = []
-            for proc_id, proc_info in self.processes.items():
-                if proc_info['process'].poll() is not None:
-                    to_remove.append(proc_id)
+            snapshot = {proc_id: proc_info for proc_id, proc_info in self._snapshot.items()
+                        if proc_info['status'] == 'running'}
+            removed = len(self._snapshot) - len(snapshot)
+            self._snapshot = snapshot
 
-            for proc_id in to_remove:
-                del self.processes[proc_id]
+            for proc_id in list(self._log_readers):
+                if proc_id not in snapshot:
+                    self._close_log_reader(proc_id)
 
-            return len(to_remove)
+            return removed
 
 class DaemonServer:
     """Socket server for daemon control"""
 
     def __init__(self, socket_path: str, log_dir: str):
         self.socket_path = socket_path
-        self.process_manager = ProcessManager(log_dir)
+        self.process_manager = ProcessManager(log_dir, on_output=self._watch_output)
         self.running = False
         self.server_socket = None
+        self.selector = None
+        self._wakeup_fds = None
+        # Clients following process output by output pipe fd, see
+        # _forward_output. Not by name, a reused name may have two pipes.
+        self._followers: Dict[int, Dict[socket.socket, Dict[str, Any]]] = {}
+        # Clients waiting for a stopped process to exit, by pid
+        self._stopping: Dict[int, Dict[socket.socket, Dict[str, Any]]] = {}
+        self._follow_decoders: Dict[int, Any] = {}
+
+        # Exited children are reaped and logs reopened from the event loop,
+        # see _handle_signals
+        signal.signal(signal.SIGCHLD, self._on_signal)
+        signal.signal(signal.SIGHUP, self._on_signal)
 
     def start(self):
         """Start the daemon server"""
@@ -225,63 +633,400 @@ class DaemonServer:
         # Create socket
         self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         self.server_socket.bind(self.socket_path)
-        self.server_socket.listen(5)
+        self.server_socket.listen(socket.SOMAXCONN)
+        self.server_socket.setblocking(False)
 
         # Set permissions
         os.chmod(self.socket_path, 0o666)
 
+        # Single-threaded event loop multiplexing the listener and all clients
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+
+        # Signal numbers are written to this pipe and wake up select()
+        self._wakeup_fds = os.pipe()
+        for fd in self._wakeup_fds:
+            os.set_blocking(fd, False)
+        signal.set_wakeup_fd(self._wakeup_fds[1])
+        self.selector.register(self._wakeup_fds[0], selectors.EVENT_READ)
+
         self.running = True
         logger.info(f"Daemon server started on {self.socket_path}")
 
         try:
             while self.running:
                 try:
-                    client_socket, _ = self.server_socket.accept()
-                    threading.Thread(
-                        target=self._handle_client,
-                        args=(client_socket,),
-                        daemon=True
-                    ).start()
+                    events = self.selector.select(self._next_timeout())
                 except OSError:
                     if self.running:
                         logger.error("Socket error occurred")
                     break
+
+                for key, mask in events:
+                    if key.fileobj is self.server_socket:
+                        self._accept_clients()
+                    elif key.fileobj == self._wakeup_fds[0]:
+                        self._handle_signals()
+                    elif isinstance(key.data, str):
+                        self._forward_output(key.fd, key.data)
+                    else:
+                        self._handle_client(key, mask)
         finally:
+            for key in list(self.selector.get_map().values()):
+                if isinstance(key.data, str):
+                    self.selector.unregister(key.fd)
+                    self.process_manager.close_output(key.fd)
+            self.selector.close()
             self.cleanup()
 
-    def _handle_client(self, client_socket):
-        """Handle client connection"""
+    def _next_timeout(self) -> Optional[float]:
+        """Do timed work that is due, return how long select() may block"""
+        timeouts = [timeout for timeout in (self.process_manager.flush_logs(),
+                                            self.process_manager.kill_overdue())
+                    if timeout is not None]
+        return min(timeouts) if timeouts else None
+
+    def _on_signal(self, signum, frame):
+        """Python-level signal handler, the work happens in _handle_signals
+
+        Reaping here could deadlock on ProcessManager._lock if the signal
+        arrives while the loop thread holds it.
+        """
+
+    def _handle_signals(self):
+        """Dispatch signals delivered through the wakeup pipe"""
         try:
-            # Receive request
-            data = client_socket.recv(4096).decode('utf-8')
-            if not data:
-                return
+            signums = os.read(self._wakeup_fds[0], 512)
+        except BlockingIOError:
+            return
+
+        if signal.SIGCHLD in signums:
+            self.process_manager.reap_children()
+            self._answer_stops()
+        if signal.SIGHUP in signums:
+            self.process_manager.reopen_logs()
+
+    def _stop_process(self, client_socket, state,
+                      request: Dict[str, Any]) -> Optional[CachedResponse]:
+        """Stop a process, replying once it has exited
+
+        The reply is deferred rather than waited for, so a process that is
+        slow to exit does not hold up the event loop.
+        """
+        proc_id = request.get('process_id')
+        if not proc_id:
+            return ERR_PROCESS_ID_REQUIRED
+
+        if not self.process_manager.stop_process(proc_id, request.get('force', False)):
+            return FAILURE
+
+        pid = self.process_manager.processes[proc_id]['pid']
+        if pid not in self.process_manager.pid_to_id:
+            # Already reaped
+            return SUCCESS
+
+        self._stopping.setdefault(pid, {})[client_socket] = state
+        return None
+
+    def _answer_stops(self):
+        """Reply to stop requests whose process has been reaped"""
+        for pid in [pid for pid in self._stopping if pid not in self.process_manager.pid_to_id]:
+            for client_socket, state in self._stopping.pop(pid).items():
+                self._send_response(client_socket, state, SUCCESS)
+
+    def _watch_output(self, proc_id: str, fd: int):
+        """Start forwarding a new process output pipe to its log"""
+        self.selector.register(fd, selectors.EVENT_READ, proc_id)
+
+    def _forward_output(self, fd: int, proc_id: str):
+        """Move readable process output into the log buffer and to followers"""
+        data = self.process_manager.drain_output(fd)
+        if data is None:
+            return
 
+        followers = self._followers.get(fd)
+        if data:
+            if followers:
+                text = self._follow_decoders[fd].decode(data)
+                for client_socket, state in list(followers.items()):
+                    if state['queued'] > FOLLOW_MAX_QUEUED:
+                        # Not reading, stop buffering the process output for it
+                        logger.warning(f"Dropping a follower of '{proc_id}' that fell behind")
+                        self._close_client(client_socket)
+                        continue
+                    self._send_response(client_socket, state, {'success': True, 'output': text})
+            return
+
+        self.selector.unregister(fd)
+        self.process_manager.close_output(fd)
+
+        # Output is complete, end every follow stream for this process
+        self._follow_decoders.pop(fd, None)
+        for client_socket, state in (self._followers.pop(fd, None) or {}).items():
+            state['close'] = True
+            self._send_response(client_socket, state, {'success': True, 'finished': True})
+
+    def _follow_log(self, client_socket, state,
+                    request: Dict[str, Any]) -> Union[Dict[str, Any], CachedResponse]:
+        """Send the log tail, then keep pushing new output to the client
+
+        The daemon writes every log itself, so new output is pushed as it
+        is read from the process pipe instead of watching the file.
+        """
+        proc_id = request.get('process_id')
+        lines = request.get('lines', 50)
+
+        if not proc_id:
+            return ERR_PROCESS_ID_REQUIRED
+        if proc_id not in self.process_manager.processes:
+            return {'error': f"Unknown process: {proc_id}"}
+
+        response = {'success': True, 'log': self.process_manager.get_process_log(proc_id, lines)}
+
+        fd = self.process_manager.output_fd(proc_id)
+        if fd is not None:
+            state['close'] = False
+            if fd not in self._followers:
+                self._followers[fd] = {}
+                self._follow_decoders[fd] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            self._followers[fd][client_socket] = state
+        else:
+            response['finished'] = True
+
+        return response
+
+    def _accept_clients(self):
+        """Accept all pending client connections"""
+        while True:
             try:
-                request = json.loads(data)
-            except json.JSONDecodeError:
-                self._send_response(client_socket, {'error': 'Invalid JSON'})
+                client_socket, _ = self.server_socket.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                logger.error(f"Failed to accept client: {e}")
                 return
 
-            # Process request
-            response = self._process_request(request)
-            self._send_response(client_socket, response)
+            client_socket.setblocking(False)
+            state = {
+                'buf': bytearray(),
+                'want': None,
+                'body': None,
+                'received': 0,
+                'codec': 'json',
+                'out': collections.deque(),
+                'queued': 0,  # Bytes in out
+                'close': False
+            }
+            self.selector.register(client_socket, selectors.EVENT_READ, state)
+
+    def _handle_client(self, key, mask):
+        """Handle readiness events on a client connection"""
+        client_socket = key.fileobj
+        state = key.data
 
+        try:
+            if mask & selectors.EVENT_READ:
+                self._read_requests(client_socket, state)
+            if mask & selectors.EVENT_WRITE and client_socket.fileno() != -1:
+                self._flush_responses(client_socket, state)
         except Exception as e:
             logger.error(f"Error handling client: {e}")
-            self._send_response(client_socket, {'error': str(e)})
-        finally:
-            client_socket.close()
+            self._close_client(client_socket)
+
+    def _read_requests(self, client_socket, state):
+        """Receive data from a client and process every complete request
+
+        Connections stay open, so a client can send any number of requests.
+        """
+        if state['body'] is not None:
+            # Large request: receive the rest straight into its buffer
+            body = state['body']
+            count = client_socket.recv_into(memoryview(body)[state['received']:])
+            if not count:
+                self._close_client(client_socket)
+                return
+
+            state['received'] += count
+            if state['received'] < len(body):
+                return
+
+            state['body'] = None
+            self._handle_request(client_socket, state, body)
+            return
+
+        data = client_socket.recv(RECV_SIZE)
+        if not data:
+            self._close_client(client_socket)
+            return
+
+        if state['close']:
+            return
+
+        buf = state['buf']
+        buf += data
+
+        while True:
+            if state['want'] is None:
+                if len(buf) < FRAME_HEADER.size:
+                    return
+                state['want'] = FRAME_HEADER.unpack_from(buf)[0]
+                del buf[:FRAME_HEADER.size]
+                if state['want'] > MAX_REQUEST_SIZE:
+                    # Never allocate what an untrusted header announces
+                    buf.clear()
+                    state['close'] = True
+                    self._send_response(client_socket, state, ERR_REQUEST_TOO_LARGE)
+                    return
+
+            want = state['want']
+            if len(buf) < want:
+                if want > RECV_SIZE:
+                    # Preallocate the whole body instead of growing buf
+                    state['body'] = bytearray(want)
+                    state['body'][:len(buf)] = buf
+                    state['received'] = len(buf)
+                    state['want'] = None
+                    buf.clear()
+                return
+
+            # Decode straight out of the receive buffer
+            with memoryview(buf) as view, view[:want] as message:
+                self._handle_request(client_socket, state, message)
+            del buf[:want]
+            state['want'] = None
+
+    def _handle_request(self, client_socket, state, message):
+        """Decode and process one request, then queue its response"""
+        codec = detect_codec(message)
+        if codec == 'msgpack' and msgpack is None:
+            state['codec'] = 'json'
+            self._send_response(client_socket, state, ERR_MSGPACK_UNSUPPORTED)
+            return
+        state['codec'] = codec
 
-    def _send_response(self, client_socket, response):
-        """Send JSON response to client"""
         try:
-            response_data = json.dumps(response).encode('utf-8')
-            client_socket.send(response_data)
-        except Exception as e:
-            logger.error(f"Failed to send response: {e}")
+            request = decode_message(message, codec)
+        except ValueError:
+            response = ERR_INVALID_JSON if codec == 'json' else ERR_INVALID_MSGPACK
+        else:
+            if not isinstance(request, dict):
+                response = ERR_INVALID_REQUEST
+            elif request.get('action') in ('stop', 'log_follow', 'log_raw'):
+                # Actions that need the connection, handled like in _process_request
+                try:
+                    if request['action'] == 'stop':
+                        response = self._stop_process(client_socket, state, request)
+                    elif request['action'] == 'log_follow':
+                        response = self._follow_log(client_socket, state, request)
+                    else:
+                        response = self._raw_log(client_socket, state, request)
+                except Exception as e:
+                    logger.error(f"Error processing request: {e}")
+                    response = {'error': str(e)}
+            else:
+                response = self._process_request(request)
+
+        if response is not None:
+            self._send_response(client_socket, state, response)
+
+    def _raw_log(self, client_socket, state, request: Dict[str, Any]) -> Optional[CachedResponse]:
+        """Send the log tail as raw bytes following a header with their length
+
+        The bytes go from the log file to the socket with os.sendfile and
+        are never copied into Python objects.
+        """
+        proc_id = request.get('process_id')
+        if not proc_id:
+            return ERR_PROCESS_ID_REQUIRED
+
+        region = self.process_manager.get_process_log_region(proc_id, request.get('lines', 50))
+        length = region.length if region is not None else 0
+        self._send_response(client_socket, state, {'success': True, 'bytes': length})
+        if region is not None:
+            if length:
+                state['out'].append(region)
+                state['queued'] += length
+            else:
+                os.close(region.fd)
+
+    def _send_response(self, client_socket, state, response):
+        """Queue a response for the client"""
+        if isinstance(response, CachedResponse):
+            chunks = [response.encode(state['codec'])]
+        else:
+            try:
+                chunks = encode_message(response, state['codec'])
+            except Exception as e:
+                logger.error(f"Failed to encode response: {e}")
+                chunks = encode_message({'error': str(e)}, state['codec'])
+
+        if not state['out']:
+            self.selector.modify(client_socket, selectors.EVENT_READ | selectors.EVENT_WRITE, state)
+        state['out'].extend(chunks)
+        state['queued'] += sum(len(chunk) for chunk in chunks)
+
+    def _flush_responses(self, client_socket, state):
+        """Write as much queued output as the socket accepts"""
+        out = state['out']
+        if isinstance(out[0], FileRegion):
+            region = out[0]
+            try:
+                sent = os.sendfile(client_socket.fileno(), region.fd, region.offset, region.length)
+            except BlockingIOError:
+                return
+            if not sent:
+                # The file shrank after its length was announced, the
+                # client cannot find the next frame anymore
+                logger.warning("Log file truncated while sending it")
+                self._close_client(client_socket)
+                return
+
+            state['queued'] -= sent
+            if sent < region.length:
+                out[0] = FileRegion(region.fd, region.offset + sent, region.length - sent)
+            else:
+                out.popleft()
+                os.close(region.fd)
+        else:
+            buffers = list(itertools.takewhile(lambda chunk: not isinstance(chunk, FileRegion),
+                                               itertools.islice(out, WRITEV_MAX_BUFFERS)))
+            try:
+                sent = os.writev(client_socket.fileno(), buffers)
+            except BlockingIOError:
+                return
 
-    def _process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+            state['queued'] -= sent
+            while sent:
+                if sent >= len(out[0]):
+                    sent -= len(out.popleft())
+                else:
+                    out[0] = memoryview(out[0])[sent:]
+                    sent = 0
+
+        if not out:
+            if state['close']:
+                self._close_client(client_socket)
+            else:
+                self.selector.modify(client_socket, selectors.EVENT_READ, state)
+
+    def _close_client(self, client_socket):
+        """Unregister and close a client connection"""
+        for followers in self._followers.values():
+            followers.pop(client_socket, None)
+        for waiting in self._stopping.values():
+            waiting.pop(client_socket, None)
+
+        try:
+            key = self.selector.unregister(client_socket)
+        except (KeyError, ValueError):
+            pass
+        else:
+            for chunk in key.data['out']:
+                if isinstance(chunk, FileRegion):
+                    os.close(chunk.fd)
+        client_socket.close()
+
+    def _process_request(self, request: Dict[str, Any]) -> Union[Dict[str, Any], CachedResponse]:
         """Process client request"""
         action = request.get('action')
 
@@ -292,21 +1037,11 @@ class DaemonServer:
                 working_dir = request.get('working_dir')
 
                 if not command:
-                    return {'error': 'Command required'}
+                    return ERR_COMMAND_REQUIRED
 
                 proc_id = self.process_manager.start_process(command, name, working_dir)
                 return {'success': True, 'process_id': proc_id}
 
-            elif action == 'stop':
-                proc_id = request.get('process_id')
-                force = request.get('force', False)
-
-                if not proc_id:
-                    return {'error': 'Process ID required'}
-
-                success = self.process_manager.stop_process(proc_id, force)
-                return {'success': success}
-
             elif action == 'status':
                 proc_id = request.get('process_id')
                 status = self.process_manager.get_process_status(proc_id)
@@ -317,7 +1052,7 @@ class DaemonServer:
                 lines = request.get('lines', 50)
 
                 if not proc_id:
-                    return {'error': 'Process ID required'}
+                    return ERR_PROCESS_ID_REQUIRED
 
                 log_lines = self.process_manager.get_process_log(proc_id, lines)
                 return {'success': True, 'log': log_lines}
@@ -327,7 +1062,7 @@ class DaemonServer:
                 return {'success': True, 'removed': removed}
 
             elif action == 'ping':
-                return {'success': True, 'message': 'pong'}
+                return PONG
 
             else:
                 return {'error': f'Unknown action: {action}'}
@@ -344,39 +1079,147 @@ class DaemonServer:
 
     def cleanup(self):
         """Cleanup resources"""
+        if self._wakeup_fds:
+            signal.set_wakeup_fd(-1)
+            for fd in self._wakeup_fds:
+                os.close(fd)
+            self._wakeup_fds = None
+
         try:
             os.unlink(self.socket_path)
         except OSError:
             pass
 
+class FrameReader:
+    """Reads length-prefixed frames from a blocking socket
+
+    Frames are received into a reusable buffer, so a small frame and its
+    header normally arrive with a single recv_into. Frames larger than
+    the buffer are received straight into one of their own size.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._buf = bytearray(RECV_SIZE)
+        self._start = 0
+        self._end = 0
+
+    def _fill(self):
+        """Receive more data after the unread bytes in the buffer"""
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buf):
+            # Move the unread bytes to the front to make room
+            pending = self._end - self._start
+            self._buf[:pending] = self._buf[self._start:self._end]
+            self._start, self._end = 0, pending
+
+        count = self.sock.recv_into(memoryview(self._buf)[self._end:])
+        if not count:
+            raise ConnectionError("Connection closed by daemon")
+        self._end += count
+
+    def read_frame(self) -> bytes:
+        """Receive the next frame body"""
+        while self._end - self._start < FRAME_HEADER.size:
+            self._fill()
+        length = FRAME_HEADER.unpack_from(self._buf, self._start)[0]
+        self._start += FRAME_HEADER.size
+
+        if length <= len(self._buf) - FRAME_HEADER.size:
+            while self._end - self._start < length:
+                self._fill()
+            body = bytes(self._buf[self._start:self._start + length])
+            self._start += length
+            return body
+
+        return self.read_exact(length)
+
+    def read_exact(self, length: int) -> bytearray:
+        """Receive exactly length bytes, e.g. raw data following a frame"""
+        # Copy what is buffered, receive the rest in place
+        data = bytearray(length)
+        received = min(self._end - self._start, length)
+        data[:received] = self._buf[self._start:self._start + received]
+        self._start += received
+
+        view = memoryview(data)
+        while received < length:
+            count = self.sock.recv_into(view[received:])
+            if not count:
+                raise ConnectionError("Connection closed by daemon")
+            received += count
+        return data
+
 class DaemonClient:
     """Client for communicating with daemon"""
 
-    def __init__(self, socket_path: str):
+    def __init__(self, socket_path: str, use_json: bool = False):
         self.socket_path = socket_path
+        self.codec = 'json' if use_json or msgpack is None else 'msgpack'
+        self._sock = None
+        self._reader = None
 
-    def _send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Send request to daemon"""
-        try:
-            client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            client_socket.connect(self.socket_path)
+    def __enter__(self):
+        return self
 
-            # Send request
-            request_data = json.dumps(request).encode('utf-8')
-            client_socket.send(request_data)
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-            # Receive response
-            response_data = client_socket.recv(8192).decode('utf-8')
-            response = json.loads(response_data)
+    def close(self):
+        """Close the connection to the daemon"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self._reader = None
 
-            client_socket.close()
-            return response
+    def _send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send request to daemon over the persistent connection"""
+        try:
+            if self._sock is None:
+                client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    client_socket.connect(self.socket_path)
+                except OSError:
+                    client_socket.close()
+                    raise
+                self._sock = client_socket
+                self._reader = FrameReader(client_socket)
+
+            try:
+                self._send_message(self._sock, request)
+                response = self._recv_message(self._reader)
+                if self._fall_back_to_json(response):
+                    self._send_message(self._sock, request)
+                    response = self._recv_message(self._reader)
+                return response
+            except Exception:
+                # Connection state is unknown, reconnect on the next request
+                self.close()
+                raise
 
         except FileNotFoundError:
             return {'error': 'Daemon not running'}
         except Exception as e:
             return {'error': str(e)}
 
+    def _fall_back_to_json(self, response: Dict[str, Any]) -> bool:
+        """Switch to JSON if the daemon cannot decode msgpack, True if it did"""
+        if self.codec == 'msgpack' and response.get('error') == MSGPACK_UNSUPPORTED:
+            self.codec = 'json'
+            return True
+        return False
+
+    def _send_message(self, client_socket, message: Dict[str, Any]):
+        """Send a framed message"""
+        client_socket.sendall(b''.join(encode_message(message, self.codec)))
+
+    @staticmethod
+    def _recv_message(reader: FrameReader) -> Dict[str, Any]:
+        """Receive a framed message"""
+        body = reader.read_frame()
+        return decode_message(body, detect_codec(body))
+
     def start_process(self, command: str, name: str = None, working_dir: str = None) -> Dict[str, Any]:
         """Start a new process"""
         request = {
@@ -413,6 +1256,52 @@ class DaemonClient:
         }
         return self._send_request(request)
 
+    def get_log_raw(self, process_id: str, lines: int = 50) -> Dict[str, Any]:
+        """Get process log as the raw bytes of its last lines"""
+        request = {
+            'action': 'log_raw',
+            'process_id': process_id,
+            'lines': lines
+        }
+        response = self._send_request(request)
+        if response.get('success'):
+            try:
+                response['log'] = self._reader.read_exact(response['bytes'])
+            except Exception as e:
+                self.close()
+                return {'error': str(e)}
+        return response
+
+    def follow_log(self, process_id: str, lines: int = 50) -> Iterator[Dict[str, Any]]:
+        """Follow process log, yielding the tail and then each new output chunk"""
+        request = {
+            'action': 'log_follow',
+            'process_id': process_id,
+            'lines': lines
+        }
+        try:
+            client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                client_socket.connect(self.socket_path)
+                self._send_message(client_socket, request)
+
+                reader = FrameReader(client_socket)
+                while True:
+                    message = self._recv_message(reader)
+                    if self._fall_back_to_json(message):
+                        self._send_message(client_socket, request)
+                        continue
+                    yield message
+                    if message.get('finished') or not message.get('success'):
+                        return
+            finally:
+                client_socket.close()
+
+        except FileNotFoundError:
+            yield {'error': 'Daemon not running'}
+        except Exception as e:
+            yield {'error': str(e)}
+
     def cleanup(self) -> Dict[str, Any]:
         """Cleanup finished processes"""
         request = {'action': 'cleanup'}
@@ -435,29 +1324,109 @@ def remove_pid_file(pid_file: str):
     except OSError:
         pass
 
+@functools.lru_cache(maxsize=64)
+def _parse_pid_file(pid_file: str, mtime_ns: int) -> Optional[int]:
+    """Parse a PID file, cached until its modification time changes"""
+    try:
+        with open(pid_file, 'r') as f:
+            return int(f.read().strip())
+    except (ValueError, OSError):
+        return None
+
+def read_pid_file(pid_file: str) -> Optional[int]:
+    """Read the PID from a PID file, None if missing or invalid"""
+    try:
+        mtime_ns = os.stat(pid_file).st_mtime_ns
+    except OSError:
+        return None
+    return _parse_pid_file(pid_file, mtime_ns)
+
 def is_daemon_running(pid_file: str) -> bool:
     """Check if daemon is already running"""
-    if not os.path.exists(pid_file):
+    try:
+        mtime_ns = os.stat(pid_file).st_mtime_ns
+    except OSError:
         return False
 
-    try:
-        with open(pid_file, 'r') as f:
-            pid = int(f.read().strip())
+    pid = _parse_pid_file(pid_file, mtime_ns)
+    if pid is not None:
+        try:
+            # Check if process exists
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            pass
 
-        # Check if process exists
-        os.kill(pid, 0)
-        return True
-    except (ValueError, OSError):
-        # PID file is stale
-        remove_pid_file(pid_file)
-        return False
+    # PID file is stale
+    remove_pid_file(pid_file)
+    return False
+
+def describe_instance(instance_name: str, base_dir: str) -> str:
+    """Get a one-line status for a daemon instance"""
+    instance_paths = get_instance_paths(instance_name, base_dir)
+    if not is_daemon_running(instance_paths['pid_file']):
+        return "STOPPED"
+
+    status = "RUNNING"
+    # Try to get process count
+    with DaemonClient(instance_paths['socket']) as client:
+        process_response = client.get_status()
+    if process_response.get('success'):
+        process_count = len(process_response['processes'])
+        status += f" ({process_count} processes)"
+    return status
+
+# Client commands simple enough to parse without argparse:
+# command -> (min, max) number of positional arguments
+FAST_COMMANDS = {'status': (0, 1), 'log': (1, 1), 'stop': (1, 1), 'cleanup': (0, 0)}
+
+def parse_fast_args(argv: List[str]) -> Optional[SimpleNamespace]:
+    """Parse the most common client invocations without importing argparse
+
+    Returns None for anything else, which is then left to argparse.
+    """
+    options = {'instance': DEFAULT_INSTANCE_NAME, 'base_dir': DEFAULT_BASE_DIR, 'json': False}
+    i = 0
+    while i < len(argv) and argv[i].startswith('-'):
+        if argv[i] == '--json':
+            options['json'] = True
+            i += 1
+        elif argv[i] in ('--instance', '--base-dir') and i + 1 < len(argv):
+            options[argv[i][2:].replace('-', '_')] = argv[i + 1]
+            i += 2
+        else:
+            return None
+
+    if i >= len(argv) or argv[i] not in FAST_COMMANDS:
+        return None
+
+    command, positional = argv[i], argv[i + 1:]
+    min_args, max_args = FAST_COMMANDS[command]
+    if not min_args <= len(positional) <= max_args:
+        return None
+    if any(arg.startswith('-') for arg in positional):
+        return None
+
+    return SimpleNamespace(
+        command=command,
+        process_id=positional[0] if positional else None,
+        force=False,
+        lines=50,
+        follow=False,
+        **options
+    )
+
+def build_parser():
+    """Build the full command line parser"""
+    import argparse
 
-def main():
     parser = argparse.ArgumentParser(description='Background Process Daemon')
     parser.add_argument('--instance', default=DEFAULT_INSTANCE_NAME,
                        help='Daemon instance name (allows multiple isolated daemons)')
     parser.add_argument('--base-dir', default=DEFAULT_BASE_DIR,
                        help='Base directory for daemon instances')
+    parser.add_argument('--json', action='store_true',
+                       help='Talk JSON to the daemon instead of msgpack')
 
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
@@ -465,6 +1434,8 @@ def main():
     daemon_parser = subparsers.add_parser('daemon', help='Start daemon server')
     daemon_parser.add_argument('--foreground', action='store_true',
                               help='Run in foreground (don\'t daemonize)')
+    daemon_parser.add_argument('--daemonized-child', action='store_true',
+                              help=argparse.SUPPRESS)
 
     # Start command
     start_parser = subparsers.add_parser('start', help='Start a process')
@@ -500,11 +1471,18 @@ def main():
     kill_parser = subparsers.add_parser('kill-instance', help='Kill daemon instance')
     kill_parser.add_argument('instance_name', nargs='?', help='Instance to kill (default: current)')
 
-    args = parser.parse_args()
+    return parser
 
-    if not args.command:
-        parser.print_help()
-        return
+def main():
+    # Common client commands skip argparse entirely
+    args = parse_fast_args(sys.argv[1:])
+    if args is None:
+        parser = build_parser()
+        args = parser.parse_args()
+
+        if not args.command:
+            parser.print_help()
+            return
 
     # Get paths for this instance
     paths = get_instance_paths(args.instance, args.base_dir)
@@ -518,6 +1496,24 @@ def main():
         print(f"Starting daemon instance: {args.instance}")
         print(f"Instance directory: {paths['instance_dir']}")
 
+        if not args.foreground and not args.daemonized_child:
+            # Daemonize: spawn a detached copy of this command in a new
+            # session instead of forking the whole interpreter twice
+            os.posix_spawn(
+                sys.executable,
+                [sys.executable, *sys.argv, '--daemonized-child'],
+                os.environ,
+                file_actions=[
+                    (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+                    (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+                    (os.POSIX_SPAWN_DUP2, 1, 2),
+                ],
+                setsid=True
+            )
+            return
+
+        setup_logging()
+
         # Create daemon server
         server = DaemonServer(paths['socket'], paths['log_dir'])
 
@@ -530,23 +1526,6 @@ def main():
         signal.signal(signal.SIGTERM, signal_handler)
         signal.signal(signal.SIGINT, signal_handler)
 
-        if not args.foreground:
-            # Daemonize
-            if os.fork() > 0:
-                sys.exit(0)
-
-            os.setsid()
-
-            if os.fork() > 0:
-                sys.exit(0)
-
-            # Redirect standard streams
-            with open('/dev/null', 'r') as dev_null:
-                os.dup2(dev_null.fileno(), sys.stdin.fileno())
-            with open('/dev/null', 'w') as dev_null:
-                os.dup2(dev_null.fileno(), sys.stdout.fileno())
-                os.dup2(dev_null.fileno(), sys.stderr.fileno())
-
         # Write PID file
         write_pid_file(paths['pid_file'])
 
@@ -557,35 +1536,22 @@ def main():
 
     elif args.command == 'list-instances':
         # List all instances
-        base_path = Path(args.base_dir)
-        if not base_path.exists():
+        if not os.path.exists(args.base_dir):
             print("No daemon instances found")
             return
 
         print("Daemon instances:")
-        for instance_dir in base_path.iterdir():
-            if instance_dir.is_dir():
-                instance_name = instance_dir.name
-                instance_paths = get_instance_paths(instance_name, args.base_dir)
-
-                if is_daemon_running(instance_paths['pid_file']):
-                    status = "RUNNING"
-                    # Try to get process count
-                    try:
-                        client = DaemonClient(instance_paths['socket'])
-                        response = client.ping()
-                        if response.get('success'):
-                            process_response = client.get_status()
-                            if process_response.get('success'):
-                                process_count = len(process_response['processes'])
-                                status += f" ({process_count} processes)"
-                    except:
-                        pass
-                else:
-                    status = "STOPPED"
-
+        with os.scandir(args.base_dir) as entries:
+            instance_names = [entry.name for entry in entries if entry.is_dir()]
+
+        # Query all instances concurrently, printing in directory order
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = executor.map(describe_instance, instance_names,
+                                    [args.base_dir] * len(instance_names))
+            for instance_name, status in zip(instance_names, statuses):
                 print(f"  {instance_name}: {status}")
-                print(f"    Directory: {instance_paths['instance_dir']}")
+                print(f"    Directory: {os.path.join(args.base_dir, instance_name)}")
 
     elif args.command == 'kill-instance':
         instance_to_kill = args.instance_name or args.instance
@@ -596,8 +1562,7 @@ def main():
             return
 
         try:
-            with open(kill_paths['pid_file'], 'r') as f:
-                pid = int(f.read().strip())
+            pid = read_pid_file(kill_paths['pid_file'])
 
             print(f"Killing daemon instance '{instance_to_kill}' (PID: {pid})")
             os.kill(pid, signal.SIGTERM)
@@ -624,75 +1589,75 @@ def main():
             print(f"Start it with: python {sys.argv[0]} --instance {args.instance} daemon")
             return
 
-        client = DaemonClient(paths['socket'])
-
-        if args.command == 'start':
-            # Use the renamed argument to avoid conflict
-            response = client.start_process(args.command_arg, args.name, args.dir)
-            if response.get('success'):
-                print(f"Started process: {response['process_id']} (instance: {args.instance})")
-            else:
-                print(f"Error: {response.get('error', 'Unknown error')}")
+        with DaemonClient(paths['socket'], use_json=args.json) as client:
+            if args.command == 'start':
+                # Use the renamed argument to avoid conflict
+                response = client.start_process(args.command_arg, args.name, args.dir)
+                if response.get('success'):
+                    print(f"Started process: {response['process_id']} (instance: {args.instance})")
+                else:
+                    print(f"Error: {response.get('error', 'Unknown error')}")
 
-        elif args.command == 'stop':
-            response = client.stop_process(args.process_id, args.force)
-            if response.get('success'):
-                print(f"Stopped process: {args.process_id} (instance: {args.instance})")
-            else:
-                print(f"Error: {response.get('error', 'Unknown error')}")
-
-        elif args.command == 'status':
-            response = client.get_status(args.process_id)
-            if response.get('success'):
-                processes = response['processes']
-                if not processes:
-                    print(f"No processes found in instance '{args.instance}'")
+            elif args.command == 'stop':
+                response = client.stop_process(args.process_id, args.force)
+                if response.get('success'):
+                    print(f"Stopped process: {args.process_id} (instance: {args.instance})")
                 else:
-                    print(f"Processes in instance '{args.instance}':")
-                    for proc_id, info in processes.items():
-                        print(f"\nProcess: {proc_id}")
-                        print(f"  Command: {info['command']}")
-                        print(f"  Status: {info['status']}")
-                        print(f"  Started: {info['started_at']}")
-                        if 'exit_code' in info:
-                            print(f"  Exit code: {info['exit_code']}")
-                        print(f"  Log: {info['log_file']}")
-            else:
-                print(f"Error: {response.get('error', 'Unknown error')}")
+                    print(f"Error: {response.get('error', 'Unknown error')}")
 
-        elif args.command == 'log':
-            if args.follow:
-                # Follow log (simple implementation)
-                print(f"Following log for {args.process_id} in instance '{args.instance}' (Ctrl+C to stop)")
-                try:
-                    last_lines = []
-                    while True:
-                        response = client.get_log(args.process_id, args.lines)
-                        if response.get('success'):
-                            lines = response['log']
-                            # Only show new lines
-                            if lines != last_lines:
-                                for line in lines:
-                                    print(line)
-                                last_lines = lines[:]
-                        time.sleep(1)
-                except KeyboardInterrupt:
-                    print("\nStopped following log")
-            else:
-                response = client.get_log(args.process_id, args.lines)
+            elif args.command == 'status':
+                response = client.get_status(args.process_id)
                 if response.get('success'):
-                    lines = response['log']
-                    for line in lines:
-                        print(line)
+                    processes = response['processes']
+                    if not processes:
+                        print(f"No processes found in instance '{args.instance}'")
+                    else:
+                        from datetime import datetime
+                        print(f"Processes in instance '{args.instance}':")
+                        for proc_id, info in processes.items():
+                            print(f"\nProcess: {proc_id}")
+                            print(f"  Command: {info['command']}")
+                            print(f"  Status: {info['status']}")
+                            started_at = datetime.fromtimestamp(info['started_at_ns'] / 1e9)
+                            print(f"  Started: {started_at.isoformat()}")
+                            if 'exit_code' in info:
+                                print(f"  Exit code: {info['exit_code']}")
+                            print(f"  Log: {info['log_file']}")
                 else:
                     print(f"Error: {response.get('error', 'Unknown error')}")
 
-        elif args.command == 'cleanup':
-            response = client.cleanup()
-            if response.get('success'):
-                print(f"Cleaned up {response['removed']} finished processes in instance '{args.instance}'")
-            else:
-                print(f"Error: {response.get('error', 'Unknown error')}")
+            elif args.command == 'log':
+                if args.follow:
+                    # Daemon pushes new output as the process writes it
+                    print(f"Following log for {args.process_id} in instance '{args.instance}' (Ctrl+C to stop)")
+                    try:
+                        for message in client.follow_log(args.process_id, args.lines):
+                            if not message.get('success'):
+                                print(f"Error: {message.get('error', 'Unknown error')}")
+                                break
+                            for line in message.get('log', []):
+                                print(line)
+                            if 'output' in message:
+                                sys.stdout.write(message['output'])
+                                sys.stdout.flush()
+                    except KeyboardInterrupt:
+                        print("\nStopped following log")
+                else:
+                    response = client.get_log_raw(args.process_id, args.lines)
+                    if response.get('success'):
+                        text = response['log'].decode('utf-8', errors='replace')
+                        if text and not text.endswith('\n'):
+                            text += '\n'
+                        sys.stdout.write(text)
+                    else:
+                        print(f"Error: {response.get('error', 'Unknown error')}")
+
+            elif args.command == 'cleanup':
+                response = client.cleanup()
+                if response.get('success'):
+                    print(f"Cleaned up {response['removed']} finished processes in instance '{args.instance}'")
+                else:
+                    print(f"Error: {response.get('error', 'Unknown error')}")
 
 if __name__ == "__main__":
     main()